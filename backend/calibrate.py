@@ -6,30 +6,45 @@ Run: python calibrate.py
 Input: ../public/{fatigue,focus,happy,sad,stress}/*.jpg
 Output: calibration.json
 """
+import os
+
+# One worker process per core already; keep each one's OpenMP/BLAS pool to a
+# single thread (inherited by the workers, so set before cv2/numpy load)
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
 import cv2
 import numpy as np
 import json
-import os
-import math
 import glob
+from concurrent.futures import ProcessPoolExecutor
 
 import mediapipe as mp
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 
+from geom import geom_features
+
 model_path = os.path.join(os.path.dirname(__file__), 'face_landmarker.task')
-if not os.path.exists(model_path):
-    print("Error: face_landmarker.task not found! Please download it.")
-    exit(1)
-
-base_options = python.BaseOptions(model_asset_path=model_path)
-options = vision.FaceLandmarkerOptions(
-    base_options=base_options,
-    output_face_blendshapes=False,
-    output_facial_transformation_matrixes=False,
-    num_faces=1
-)
-detector = vision.FaceLandmarker.create_from_options(options)
+
+# One FaceLandmarker per worker process (it isn't thread-safe and doesn't survive fork)
+detector = None
+
+
+def _init_detector():
+    global detector
+    cv2.setNumThreads(1)
+    base_options = python.BaseOptions(model_asset_path=model_path,
+                                      delegate=python.BaseOptions.Delegate.CPU)
+    options = vision.FaceLandmarkerOptions(
+        base_options=base_options,
+        running_mode=vision.RunningMode.IMAGE,
+        output_face_blendshapes=False,
+        output_facial_transformation_matrixes=False,
+        num_faces=1
+    )
+    detector = vision.FaceLandmarker.create_from_options(options)
+
 
 CATEGORIES = ["fatigue", "focus", "happy", "sad", "stress"]
 IMG_DIR = os.path.join(os.path.dirname(__file__), "..", "public")
@@ -45,44 +60,12 @@ def extract_features(img_path: str) -> dict | None:
         return None
 
     lm = result.face_landmarks[0]
+    flat = np.empty(2 * len(lm), dtype=np.float32)
+    flat[0::2] = [p.x for p in lm]
+    flat[1::2] = [p.y for p in lm]
+    pts = flat.reshape(-1, 2)
 
-    # EAR (Eye Aspect Ratio)
-    def ear(idx):
-        pts = np.array([[lm[i].x, lm[i].y] for i in idx])
-        A = np.linalg.norm(pts[1] - pts[5])
-        B = np.linalg.norm(pts[2] - pts[4])
-        C = np.linalg.norm(pts[0] - pts[3])
-        return (A + B) / (2.0 * C) if C > 0 else 0.25
-
-    left_ear = ear([33, 7, 163, 144, 145, 153])
-    right_ear = ear([362, 398, 384, 385, 387, 263])
-    avg_ear = (left_ear + right_ear) / 2.0
-
-    # Head pose
-    nose = lm[1]; forehead = lm[10]; chin = lm[152]
-    face_h = abs(chin.y - forehead.y)
-    nose_pos = (nose.y - forehead.y) / face_h if face_h > 0 else 0.5
-
-    # Roll
-    le = lm[33]; re = lm[263]
-    roll = math.degrees(math.atan2(re.y - le.y, re.x - le.x))
-
-    # Mouth
-    mouth_w = abs(lm[291].x - lm[61].x)
-    mouth_h = abs(lm[14].y - lm[13].y)
-    mouth_ratio = mouth_h / mouth_w if mouth_w > 0 else 0
-    lip_stretch = abs(lm[291].x - lm[61].x)
-    mouth_open = lm[14].y - lm[13].y
-
-    # Brow
-    left_brow = (lm[107].y + lm[66].y) / 2
-    right_brow = (lm[336].y + lm[296].y) / 2
-    avg_brow = (left_brow + right_brow) / 2
-    nose_bridge = lm[6].y
-    brow_raise = nose_bridge - avg_brow
-
-    # Inner brow distance
-    brow_furrow = abs(lm[107].y - lm[336].y)
+    avg_ear, nose_pos, roll, mouth_ratio, lip_stretch, mouth_open, brow_raise, brow_furrow = geom_features(pts)
 
     return {
         "ear": round(avg_ear, 4),
@@ -97,23 +80,35 @@ def extract_features(img_path: str) -> dict | None:
 
 
 def main():
+    if not os.path.exists(model_path):
+        print("Error: face_landmarker.task not found! Please download it.")
+        exit(1)
+
     calibration = {}
 
+    # Collect every image up front, then extract features across all cores
+    cat_images = {}
     for cat in CATEGORIES:
         cat_dir = os.path.join(IMG_DIR, cat)
         if not os.path.isdir(cat_dir):
             print(f"[WARN] no dir: {cat_dir}")
             continue
-
         images = glob.glob(os.path.join(cat_dir, "*.jpg")) + glob.glob(os.path.join(cat_dir, "*.png"))
+        cat_images[cat] = sorted(images)
+
+    all_images = [p for images in cat_images.values() for p in images]
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_detector) as ex:
+        all_feats = dict(zip(all_images, ex.map(extract_features, all_images, chunksize=4)))
+
+    for cat, images in cat_images.items():
         print(f"\n{'='*50}")
         print(f"[{cat.upper()}] — {len(images)} images")
         print(f"{'='*50}")
 
         features_list = []
-        for img_path in sorted(images):
+        for img_path in images:
             fname = os.path.basename(img_path)
-            feats = extract_features(img_path)
+            feats = all_feats[img_path]
             if feats:
                 features_list.append(feats)
                 print(f"  ✓ {fname}: EAR={feats['ear']:.3f} nose={feats['nose_pos']:.3f} mouth={feats['mouth_ratio']:.3f} brow={feats['brow_raise']:.4f}")
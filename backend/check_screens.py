@@ -0,0 +1,136 @@
+"""
+Screen Classification Check — Regression fixtures for /analyze-screen.
+Renders deterministic synthetic screens (dark code, light reading, sparse text,
+colour blocks, smooth video-like frames, idle, noise) at common capture sizes and
+classifies each through server._screen. Every label must match the original
+full-resolution rules (640px, HSV saturation, Canny, 21x21 blur), kept below as the
+reference, so resolution or threshold changes can't silently move the bins.
+
+Known divergences are listed in EXPECTED_DIFF with the reason; they are reported
+but do not fail the check (a listed frame that starts matching is reported too).
+
+Run: python check_screens.py
+Exit status is non-zero on any mismatch.
+"""
+import io
+import sys
+
+import cv2
+import numpy as np
+
+import server
+
+SIZES = ((1920, 1080), (1280, 720))
+
+# Blurred pixel noise only reads as READING in the reference because its bilinear
+# 640px resize aliases the texture back in (Canny then counts it as edges). Any
+# area-averaged downscale removes it, so the server sees a featureless frame.
+EXPECTED_DIFF = {
+    "noise@1920": ("READING", "BROWSING"),
+    "noise@1280": ("READING", "BROWSING"),
+}
+CHARS = list("abcdefghijklmnop (){}=;:_.,")
+
+
+def _text_screen(rng, w, h, bg, fg, lines, scale):
+    img = np.full((h, w, 3), bg, np.uint8)
+    thick = max(1, w // 960)
+    for i in range(lines):
+        s = "".join(rng.choice(CHARS, size=int(rng.integers(30, 120))))
+        x = int(w * 0.01) + int(rng.integers(0, w // 12))
+        cv2.putText(img, s, (x, int(h * 0.03) + i * (h // lines)), cv2.FONT_HERSHEY_SIMPLEX,
+                    scale * w / 1920, fg, thick)
+    return img
+
+
+def _blocks(rng, w, h, n):
+    img = np.zeros((h, w, 3), np.uint8)
+    for _ in range(n):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        bw, bh = int(rng.integers(w // 24, w // 2)), int(rng.integers(h // 14, h // 2))
+        cv2.rectangle(img, (x, y), (x + bw, y + bh), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    return cv2.GaussianBlur(img, (15, 15), 0)
+
+
+def _video(rng, w, h, value):
+    # Smooth scene with a wide saturation spread at one brightness level
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    sat = 128 + 110 * np.sin(xx / w * 2 * np.pi + rng.uniform(0, np.pi)) * np.cos(yy / h * np.pi)
+    hsv = np.dstack([np.full_like(sat, int(rng.integers(0, 180))), sat, np.full_like(sat, value)])
+    return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+
+
+def fixtures():
+    """Yield (name, bgr) pairs; the same seed always renders the same frames."""
+    rng = np.random.default_rng(5)
+    for w, h in SIZES:
+        for k in range(3):
+            yield f"code{k}@{w}", _text_screen(rng, w, h, (30, 30, 30), (200, 220, 180), 35 + 8 * k, 0.9)
+        for k in range(3):
+            yield f"read{k}@{w}", _text_screen(rng, w, h, (250, 250, 250), (20, 20, 20), 40 + 8 * k, 0.9)
+        for k in range(3):
+            yield f"sparse{k}@{w}", _text_screen(rng, w, h, (250, 250, 250), (20, 20, 20), 6 + 3 * k, 1.2)
+        for k in range(3):
+            yield f"blocks{k}@{w}", _blocks(rng, w, h, 5 + 10 * k)
+        for k, value in enumerate((90, 160, 230)):
+            yield f"video{k}@{w}", _video(rng, w, h, value)
+        yield f"idle@{w}", np.full((h, w, 3), 10, np.uint8)
+        yield f"noise@{w}", cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3)).astype(np.uint8), (5, 5), 0)
+
+
+def reference(img) -> str:
+    """The original /analyze-screen rules, unchanged."""
+    h, w = img.shape[:2]
+    if w > 640:
+        img = cv2.resize(img, (640, int(h * 640 / w)))
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+
+    avg_bright = np.mean(gray)
+    color_std = np.std(hsv[:, :, 1])
+    edges = cv2.Canny(gray, 50, 150)
+    edge_d = np.sum(edges > 0) / edges.size
+    dark_pix = np.sum(gray < 50) / gray.size
+    is_dark = dark_pix > 0.4
+    blur = cv2.GaussianBlur(gray, (21, 21), 0)
+    uniform = 1.0 - (np.std(blur) / 128.0)
+
+    if is_dark and edge_d > 0.08:
+        return "CODING"
+    if edge_d > 0.12:
+        return "READING"
+    if uniform > 0.85 and color_std > 40:
+        return "WATCHING"
+    if color_std > 50 and edge_d < 0.06:
+        return "SOCIAL_MEDIA"
+    if avg_bright < 30 and edge_d < 0.03:
+        return "IDLE"
+    return "BROWSING"
+
+
+def classify(img) -> str:
+    """Current server pipeline, PNG-encoded like an upload; dHash reuse disabled."""
+    server._last_screen_result = None
+    data = cv2.imencode(".png", img)[1].tobytes()
+    return server._screen(io.BytesIO(data))["activity"]
+
+
+def main():
+    failures = 0
+    for name, img in fixtures():
+        want, got = reference(img), classify(img)
+        if name in EXPECTED_DIFF:
+            ok = (want, got) == EXPECTED_DIFF[name]
+            status = "diff" if ok else "FAIL"
+        else:
+            ok = want == got
+            status = "ok  " if ok else "FAIL"
+        failures += not ok
+        print(f"{status} {name:<14} reference={want:<13} server={got}")
+    print(f"{failures} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
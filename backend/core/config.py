@@ -1,6 +1,13 @@
+import os
+
 class Settings:
     face_detection_confidence: float = 0.5
     blink_threshold: float = 0.2
+    session_mesh_max: int = 8
+    session_mesh_idle_s: float = 30.0
+    screen_cache_size: int = 512
+    text_cache_size: int = 1024
+    ocr_pool_size: int = max(1, (os.cpu_count() or 2) // 2)
     distraction_keywords: list = ["facebook", "twitter", "instagram", "reddit", "youtube"]
 
 settings = Settings()
@@ -0,0 +1,209 @@
+"""
+Per-frame landmark geometry kernels for /analyze-face and calibrate.py.
+geom_features() computes the raw EAR / pose / mouth / brow scalars; analyze_landmarks()
+adds gaze, fatigue and the emotion cascade on top in one compiled call.
+Categorical outputs are small int codes — decode with GAZES / ACTIONS / EMOTIONS.
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_OK = True
+except Exception:
+    NUMBA_OK = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+
+GAZES = ("CENTER", "LEFT", "RIGHT")
+ACTIONS = ("normal", "head_down", "looking_up", "head_tilt", "stressed")
+EMOTIONS = ("neutral", "surprised", "happy", "tired", "sad", "angry", "fear")
+
+# ── Landmark indices (MediaPipe face mesh) ──────────────────────────────────
+# EAR rows: [outer, top1, top2, inner, bottom2, bottom1]
+LEFT_EAR_IDX = np.array([33, 7, 163, 144, 145, 153], dtype=np.int64)
+RIGHT_EAR_IDX = np.array([362, 398, 384, 385, 387, 263], dtype=np.int64)
+EAR_IDX = np.stack([LEFT_EAR_IDX, RIGHT_EAR_IDX])
+NOSE, FOREHEAD, CHIN = 1, 10, 152
+LEFT_EYE_OUT, RIGHT_EYE_OUT = 33, 263
+MOUTH_L, MOUTH_R, LIP_TOP, LIP_BOT = 61, 291, 13, 14
+BROW_IL, BROW_OL, BROW_IR, BROW_OR = 107, 66, 336, 296
+NOSE_BRIDGE = 6
+
+# ── Emotion rule table ───────────────────────────────────────────────────────
+# Feature vector columns fed to the rule table
+F_MOUTH, F_BROW, F_EAR, F_LIP, F_PITCH, F_FATIGUE, F_EYES_LOW = range(7)
+N_FEATURES = 7
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    """Per-user feature thresholds, derived once from calibration.json."""
+    ear: float = 0.22
+    nose: float = 0.65
+    mouth: float = 0.08
+    brow: float = 0.015
+
+    @classmethod
+    def from_calibration(cls, calib: dict) -> "Thresholds":
+        th = {}
+        if "fatigue" in calib and "focus" in calib:
+            f_avg = calib["fatigue"]["avg"]
+            fc_avg = calib["focus"]["avg"]
+            th["ear"] = (f_avg["ear"] + fc_avg["ear"]) / 2.0
+            th["nose"] = (f_avg["nose_pos"] + fc_avg["nose_pos"]) / 2.0
+        if "happy" in calib:
+            th["mouth"] = calib["happy"]["avg"]["mouth_ratio"] * 0.7
+        if "sad" in calib:
+            th["brow"] = calib["sad"]["avg"]["brow_raise"] * 1.2
+        return cls(**th)
+
+
+# Open rule bounds. Finite on purpose: fastmath lets the kernels assume no infinities
+UNBOUNDED = 1e30
+
+
+def emotion_rules(th: Thresholds):
+    """
+    Compile the emotion cascade into a table: row k matches when lo[k] < feat < hi[k]
+    for every column (open sides are ±UNBOUNDED). Rows are in priority order; the last
+    row always matches. Returns (lo, hi, emotion_codes, confidences).
+    """
+    rows = [
+        # (emotion, conf, {feature: (lo, hi)})
+        ("surprised", 0.9, {F_MOUTH: (th.mouth * 4.0, None), F_BROW: (th.brow * 2.5, None)}),
+        ("happy", 0.85, {F_MOUTH: (th.mouth, None), F_LIP: (0.14, None)}),
+        ("tired", 0.9, {F_EAR: (None, th.ear), F_PITCH: (0.5, None)}),
+        ("sad", 0.75, {F_BROW: (None, th.brow), F_MOUTH: (None, th.mouth * 0.5), F_EAR: (None, th.ear)}),
+        ("angry", 0.7, {F_BROW: (None, th.brow), F_MOUTH: (None, th.mouth * 0.5)}),
+        ("tired", 0.85, {F_FATIGUE: (0.6, None)}),
+        ("tired", 0.8, {F_EYES_LOW: (4, None)}),
+        ("neutral", 0.9, {}),
+    ]
+    lo = np.full((len(rows), N_FEATURES), -UNBOUNDED)
+    hi = np.full((len(rows), N_FEATURES), UNBOUNDED)
+    for k, (_, _, conds) in enumerate(rows):
+        for f, (a, b) in conds.items():
+            if a is not None:
+                lo[k, f] = a
+            if b is not None:
+                hi[k, f] = b
+    codes = np.array([EMOTIONS.index(r[0]) for r in rows], dtype=np.int64)
+    confs = np.array([r[1] for r in rows])
+    return lo, hi, codes, confs
+
+
+@njit(cache=True, fastmath=True)
+def geom_features(lm):
+    """
+    Raw landmark geometry for an (N, 2) float32 array.
+    Returns (avg_ear, nose_pos, roll, m_ratio, lip_stretch, mouth_open, brow_raise, brow_furrow).
+    """
+    ear_sum = 0.0
+    for e in range(2):
+        i = EAR_IDX[e]
+        a = math.hypot(lm[i[1], 0] - lm[i[5], 0], lm[i[1], 1] - lm[i[5], 1])
+        b = math.hypot(lm[i[2], 0] - lm[i[4], 0], lm[i[2], 1] - lm[i[4], 1])
+        c = math.hypot(lm[i[0], 0] - lm[i[3], 0], lm[i[0], 1] - lm[i[3], 1])
+        ear_sum += (a + b) / (2.0 * c) if c > 0 else 0.25
+    avg_ear = ear_sum / 2.0
+
+    face_h = abs(lm[CHIN, 1] - lm[FOREHEAD, 1])
+    nose_pos = (lm[NOSE, 1] - lm[FOREHEAD, 1]) / face_h if face_h > 0 else 0.5
+
+    roll = math.degrees(math.atan2(lm[RIGHT_EYE_OUT, 1] - lm[LEFT_EYE_OUT, 1],
+                                  lm[RIGHT_EYE_OUT, 0] - lm[LEFT_EYE_OUT, 0]))
+
+    mouth_w = abs(lm[MOUTH_R, 0] - lm[MOUTH_L, 0])
+    mouth_open = lm[LIP_BOT, 1] - lm[LIP_TOP, 1]
+    m_ratio = abs(mouth_open) / mouth_w if mouth_w > 0 else 0.0
+
+    avg_brow = ((lm[BROW_IL, 1] + lm[BROW_OL, 1]) / 2 + (lm[BROW_IR, 1] + lm[BROW_OR, 1]) / 2) / 2
+    brow_raise = lm[NOSE_BRIDGE, 1] - avg_brow
+    brow_furrow = abs(lm[BROW_IL, 1] - lm[BROW_IR, 1])
+
+    return avg_ear, nose_pos, roll, m_ratio, mouth_w, mouth_open, brow_raise, brow_furrow
+
+
+@njit(cache=True, fastmath=True)
+def analyze_landmarks(lm, th_ear, th_nose, rules_lo, rules_hi, rules_code, rules_conf,
+                      prev_emotion, head_down_n, eyes_low_n):
+    """
+    lm: (N, 2) float32 normalized landmark coords; rules_* from emotion_rules().
+    Returns (fatigue, blink, roll, gaze, action, emotion, conf, head_down_n, eyes_low_n).
+    """
+    action = 0
+
+    avg_ear, nose_pos, roll, m_ratio, lip_stretch, _, brow_raise, _ = geom_features(lm)
+    blink = round(avg_ear, 3)
+
+    # ── Head pose ────────────────────────────────────────────────────────────
+    if nose_pos > th_nose:
+        head_down_n += 1
+        action = 1
+    else:
+        head_down_n = max(0, head_down_n - 1)
+
+    if nose_pos < th_nose * 0.6:
+        action = 2
+
+    pitch_f = max(0.0, min(1.0, (nose_pos - th_nose * 0.8) / 0.2))
+    ear_f = max(0.0, min(1.0, (th_ear * 1.2 - avg_ear) / (th_ear * 0.5)))
+
+    if avg_ear < th_ear:
+        eyes_low_n += 1
+    else:
+        eyes_low_n = max(0, eyes_low_n - 1)
+
+    # Roll (head tilt)
+    roll_f = min(abs(roll) / 18.0, 1.0)
+    if abs(roll) > 15:
+        action = 3
+
+    # Combined fatigue
+    fatigue = round(max(0.02, min(0.98,
+        0.35 * pitch_f + 0.35 * ear_f + 0.15 * roll_f + 0.15 * min(head_down_n / 5, 1.0)
+    )), 3)
+
+    # Stressed detection (sad / neutral / fear)
+    if fatigue > 0.5 and head_down_n > 3 and (prev_emotion == 4 or prev_emotion == 0 or prev_emotion == 6):
+        action = 4
+
+    # ── Gaze ─────────────────────────────────────────────────────────────────
+    # Branchless: 0 inside the ±0.03 dead zone, 2 (RIGHT) above, 1 (LEFT) below
+    d = (lm[LEFT_EYE_OUT, 0] + lm[RIGHT_EYE_OUT, 0]) / 2 - lm[NOSE, 0]
+    gaze = 2 * (d >= 0.03) + (d <= -0.03)
+
+    # ── Emotion ──────────────────────────────────────────────────────────────
+    feat = np.empty(N_FEATURES)
+    feat[F_MOUTH] = m_ratio
+    feat[F_BROW] = brow_raise
+    feat[F_EAR] = avg_ear
+    feat[F_LIP] = lip_stretch
+    feat[F_PITCH] = pitch_f
+    feat[F_FATIGUE] = fatigue
+    feat[F_EYES_LOW] = eyes_low_n
+
+    k = 0
+    for k in range(rules_lo.shape[0]):
+        hit = True
+        for f in range(N_FEATURES):
+            if not (rules_lo[k, f] < feat[f] < rules_hi[k, f]):
+                hit = False
+                break
+        if hit:
+            break
+    emotion, conf = rules_code[k], rules_conf[k]
+
+    return fatigue, blink, roll, gaze, action, emotion, conf, head_down_n, eyes_low_n
+
+
+# Compile on import so the first request doesn't pay JIT cost
+geom_features(np.zeros((478, 2), dtype=np.float32))
+analyze_landmarks(np.zeros((478, 2), dtype=np.float32), 0.22, 0.65, *emotion_rules(Thresholds()), 0, 0, 0)
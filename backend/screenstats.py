@@ -0,0 +1,64 @@
+"""
+Fused per-pixel statistics for /analyze-screen.
+One streaming pass over the BGR frame yields brightness, dark-pixel count and
+HSV-saturation moments, instead of separate gray / histogram / HSV / std passes.
+Without numba the same sums come from cv2/numpy passes (identical results).
+"""
+import cv2
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_OK = True
+except Exception:
+    NUMBA_OK = False
+
+
+DARK_LEVEL = 50
+
+# OpenCV's BGR2HSV fixed-point divisor: S = ((max - min) * SDIV[max] + 2048) >> 12
+SDIV = np.array([0] + [round(255 * 4096 / v) for v in range(1, 256)], dtype=np.int64)
+
+
+if NUMBA_OK:
+    @njit(cache=True, fastmath=True)
+    def screen_stats(bgr):
+        """
+        bgr: (H, W, 3) uint8. Gray and sat match OpenCV's BGR2GRAY and 8-bit BGR2HSV S.
+        Returns (gray_sum, dark_count, sat_sum, sat_sq_sum).
+        Serial on purpose: it runs on the screen worker thread, and a parallel kernel
+        would spawn a Numba thread pool per calling thread on top of it.
+        """
+        h, w = bgr.shape[:2]
+        gray_sum = 0
+        dark = 0
+        s_sum = 0
+        s_sq = 0
+        for y in range(h):
+            for x in range(w):
+                b = np.int64(bgr[y, x, 0])
+                g = np.int64(bgr[y, x, 1])
+                r = np.int64(bgr[y, x, 2])
+                v = (r * 9798 + g * 19235 + b * 3735 + 16384) >> 15
+                gray_sum += v
+                if v < DARK_LEVEL:
+                    dark += 1
+                mx = max(b, g, r)
+                sat = ((mx - min(b, g, r)) * SDIV[mx] + 2048) >> 12
+                s_sum += sat
+                s_sq += sat * sat
+        return gray_sum, dark, s_sum, s_sq
+
+    # Compile on import so the first request doesn't pay JIT cost
+    screen_stats(np.zeros((8, 8, 3), dtype=np.uint8))
+else:
+    def screen_stats(bgr):
+        """Vectorized equivalent of the Numba kernel (a per-pixel Python loop is far too slow)."""
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        sat = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)[:, :, 1].astype(np.int64)
+        return (
+            int(gray.sum(dtype=np.int64)),
+            cv2.countNonZero((gray < DARK_LEVEL).view(np.uint8)),
+            int(sat.sum()),
+            int((sat * sat).sum()),
+        )
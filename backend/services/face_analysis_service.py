@@ -2,7 +2,9 @@ import cv2
 import mediapipe as mp
 import numpy as np
 import math
+import time
 import structlog
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 from models.responses import FaceAnalysisResponse, GazeDirection
 from utils.image_utils import image_processor
@@ -10,6 +12,24 @@ from core.config import settings
 
 logger = structlog.get_logger()
 
+# Eye landmark indices (MediaPipe Face Mesh); EAR uses the first six of each
+LEFT_EYE_IDX = np.array([33, 7, 163, 144, 145, 153, 154, 155, 133])
+RIGHT_EYE_IDX = np.array([362, 398, 384, 385, 386, 387, 388, 466, 263])
+EYES_IDX = np.stack([LEFT_EYE_IDX, RIGHT_EYE_IDX])
+# EAR point pairs: two vertical (1-5, 2-4) and the horizontal (0-3)
+EAR_A = np.array([1, 2, 0])
+EAR_B = np.array([5, 4, 3])
+GAZE_LUT = (GazeDirection.CENTER, GazeDirection.LEFT, GazeDirection.RIGHT)
+
+
+def landmarks_to_array(landmarks) -> np.ndarray:
+    """Materialize a landmark list once as an (N, 2) float32 array of x, y."""
+    # Two flat comprehensions into strided slots beat a per-point generator ~2x
+    flat = np.empty(2 * len(landmarks), dtype=np.float32)
+    flat[0::2] = [p.x for p in landmarks]
+    flat[1::2] = [p.y for p in landmarks]
+    return flat.reshape(-1, 2)
+
 class FaceAnalysisService:  
     """
     MediaPipe-based face analysis for productivity modeling.
@@ -24,20 +44,12 @@ class FaceAnalysisService:
     def __init__(self):
         self.mp_face_mesh = mp.solutions.face_mesh
         self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_face_detection = mp.solutions.face_detection
         
         # Initialize MediaPipe Face Mesh with privacy settings
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=settings.face_detection_confidence,
-            min_tracking_confidence=0.5
-        )
+        self.face_mesh = self._create_mesh()
         
-        # Initialize Face Detection for presence
-        self.face_detection = self.mp_face_detection.FaceDetection(
-            min_detection_confidence=settings.face_detection_confidence
-        )
+        # Per-session meshes (LRU, idle-evicted) so each stream keeps its own tracker state
+        self._session_meshes = OrderedDict()
         
         logger.info(
             "Face analysis service initialized",
@@ -46,20 +58,59 @@ class FaceAnalysisService:
             no_raw_storage=True
         )
     
-    def calculate_eye_aspect_ratio(self, eye_landmarks: np.ndarray) -> float:
+    def _create_mesh(self):
+        # refine_landmarks off: iris points (468-477) are never read, so skip the iris submodel
+        return self.mp_face_mesh.FaceMesh(
+            max_num_faces=1,
+            refine_landmarks=False,
+            min_detection_confidence=settings.face_detection_confidence,
+            min_tracking_confidence=0.5
+        )
+    
+    def get_face_mesh(self, session_id: Optional[str] = None):
+        """
+        Return the FaceMesh for a client session.
+        
+        ML Relevance: FaceMesh tracks landmarks across frames and skips its
+        detector while tracking holds. Interleaved clients on one instance keep
+        resetting that tracker, so each session gets its own.
+        """
+        if session_id is None:
+            return self.face_mesh
+        
+        now = time.monotonic()
+        # Evict idle sessions (oldest first)
+        while self._session_meshes:
+            sid, (mesh, last_seen) = next(iter(self._session_meshes.items()))
+            if now - last_seen <= settings.session_mesh_idle_s:
+                break
+            del self._session_meshes[sid]
+            mesh.close()
+        
+        entry = self._session_meshes.get(session_id)
+        if entry is None:
+            if len(self._session_meshes) >= settings.session_mesh_max:
+                _, (old_mesh, _) = self._session_meshes.popitem(last=False)
+                old_mesh.close()
+            entry = [self._create_mesh(), now]
+            self._session_meshes[session_id] = entry
+        else:
+            entry[1] = now
+            self._session_meshes.move_to_end(session_id)
+        return entry[0]
+    
+    def calculate_eye_aspect_ratio(self, eye_landmarks: np.ndarray) -> np.ndarray:
         """
         Calculate Eye Aspect Ratio (EAR) for blink detection.
         
         ML Relevance: EAR is a proven indicator of fatigue and engagement.
         Lower EAR values indicate drowsiness or eye closure.
+        Accepts one eye (K, 2) or stacked eyes (E, K, 2); returns one EAR per eye.
         """
         try:
-            # Vertical eye landmarks
-            A = np.linalg.norm(eye_landmarks[1] - eye_landmarks[5])
-            B = np.linalg.norm(eye_landmarks[2] - eye_landmarks[4])
-            
-            # Horizontal eye landmarks
-            C = np.linalg.norm(eye_landmarks[0] - eye_landmarks[3])
+            # Both vertical and the horizontal distance in one batched norm
+            d = np.linalg.norm(eye_landmarks[..., EAR_A, :] - eye_landmarks[..., EAR_B, :], axis=-1)
+            A, B, C = d[..., 0], d[..., 1], d[..., 2]
             
             # Eye Aspect Ratio
             ear = (A + B) / (2.0 * C)
@@ -70,21 +121,16 @@ class FaceAnalysisService:
             logger.warning("Error calculating EAR", error=str(e))
             return 0.3  # Default normal EAR
     
-    def get_eye_landmarks(self, landmarks: list, eye_indices: list) -> np.ndarray:
-        """Extract eye landmarks for EAR calculation."""
+    def get_eye_landmarks(self, landmarks: np.ndarray, eye_indices: np.ndarray) -> np.ndarray:
+        """Extract eye landmarks for EAR calculation (single gather)."""
         try:
-            eye_points = []
-            for idx in eye_indices:
-                landmark = landmarks[idx]
-                eye_points.append([landmark.x, landmark.y])
-            
-            return np.array(eye_points)
+            return landmarks[eye_indices]
             
         except Exception as e:
             logger.warning("Error extracting eye landmarks", error=str(e))
             return np.array([])
     
-    def estimate_head_pose(self, landmarks: list) -> Dict[str, float]:
+    def estimate_head_pose(self, landmarks: np.ndarray) -> Dict[str, float]:
         """
         Estimate head pose (tilt, pan, roll) from facial landmarks.
         
@@ -92,18 +138,11 @@ class FaceAnalysisService:
         """
         try:
             # Key facial points for pose estimation
-            nose_tip = landmarks[1]
-            chin = landmarks[175]
             left_eye = landmarks[33]
             right_eye = landmarks[263]
             
-            # Calculate head tilt (rotation around Z-axis)
-            eye_center_x = (left_eye.x + right_eye.x) / 2
-            eye_center_y = (left_eye.y + right_eye.y) / 2
-            
-            # Simple tilt calculation based on eye line
-            dx = right_eye.x - left_eye.x
-            dy = right_eye.y - left_eye.y
+            # Simple tilt calculation based on eye line (rotation around Z-axis)
+            dx, dy = right_eye - left_eye
             tilt_angle = math.degrees(math.atan2(dy, dx))
             
             return {
@@ -116,29 +155,18 @@ class FaceAnalysisService:
             logger.warning("Error estimating head pose", error=str(e))
             return {"tilt": 0.0, "pan": 0.0, "roll": 0.0}
     
-    def estimate_gaze_direction(self, landmarks: list) -> GazeDirection:
+    def estimate_gaze_direction(self, landmarks: np.ndarray) -> GazeDirection:
         """
         Estimate gaze direction from eye landmarks.
         
         ML Relevance: Gaze direction indicates focus and attention patterns.
         """
         try:
-            # Get eye centers
-            left_eye_center = landmarks[33]  # Left eye corner
-            right_eye_center = landmarks[263]  # Right eye corner
-            nose_tip = landmarks[1]
-            
-            # Calculate gaze based on eye-nose alignment
-            eye_center = (left_eye_center.x + right_eye_center.x) / 2
-            nose_x = nose_tip.x
+            # Calculate gaze based on eye-nose alignment (eye corners 33/263, nose tip 1)
+            d = (landmarks[33, 0] + landmarks[263, 0]) / 2 - landmarks[1, 0]
             
-            # Simple gaze estimation
-            if abs(eye_center - nose_x) < 0.05:
-                return GazeDirection.CENTER
-            elif eye_center > nose_x:
-                return GazeDirection.RIGHT
-            else:
-                return GazeDirection.LEFT
+            # Simple gaze estimation: ±0.05 dead zone, sign picks the side
+            return GAZE_LUT[2 * (d >= 0.05) + (d <= -0.05)]
                 
         except Exception as e:
             logger.warning("Error estimating gaze direction", error=str(e))
@@ -166,14 +194,15 @@ class FaceAnalysisService:
             logger.warning("Error calculating fatigue score", error=str(e))
             return 0.0
     
-    async def analyze_frame(self, frame_data: str) -> FaceAnalysisResponse:
+    async def analyze_frame(self, frame_data: str, session_id: Optional[str] = None) -> FaceAnalysisResponse:
         """
         Analyze face frame for behavioral signals.
         
+        Pass a stable session_id per client stream so landmark tracking carries over.
         Privacy: Processes frame in memory only, never stores raw data.
         Returns: Structured behavioral metrics for ML training.
         """
-        start_time = cv2.getTickCount()
+        start_ns = time.perf_counter_ns()
         
         try:
             # Decode and preprocess image
@@ -192,9 +221,10 @@ class FaceAnalysisService:
             image = image_processor.resize_image(image)
             image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
-            # Face detection
-            detection_results = self.face_detection.process(image_rgb)
-            face_present = len(detection_results.detections) > 0
+            # Face mesh analysis — FaceMesh runs its own detector, so its
+            # landmarks double as the presence check (no second BlazeFace pass)
+            mesh_results = self.get_face_mesh(session_id).process(image_rgb)
+            face_present = bool(mesh_results.multi_face_landmarks)
             
             if not face_present:
                 logger.debug("No face detected in frame")
@@ -206,66 +236,45 @@ class FaceAnalysisService:
                     fatigue_score=0.0
                 )
             
-            # Face mesh analysis
-            mesh_results = self.face_mesh.process(image_rgb)
+            landmarks = landmarks_to_array(mesh_results.multi_face_landmarks[0].landmark)
             
-            if mesh_results.multi_face_landmarks:
-                landmarks = mesh_results.multi_face_landmarks[0].landmark
-                
-                # Eye landmarks indices (MediaPipe Face Mesh)
-                left_eye_indices = [33, 7, 163, 144, 145, 153, 154, 155, 133]
-                right_eye_indices = [362, 398, 384, 385, 386, 387, 388, 466, 263]
-                
-                # Calculate EAR for both eyes
-                left_ear = self.calculate_eye_aspect_ratio(
-                    self.get_eye_landmarks(landmarks, left_eye_indices)
-                )
-                right_ear = self.calculate_eye_aspect_ratio(
-                    self.get_eye_landmarks(landmarks, right_eye_indices)
-                )
-                avg_ear = (left_ear + right_ear) / 2.0
-                
-                # Head pose estimation
-                head_pose = self.estimate_head_pose(landmarks)
-                
-                # Gaze direction
-                gaze_direction = self.estimate_gaze_direction(landmarks)
-                
-                # Fatigue scoring
-                fatigue_score = self.calculate_fatigue_score(avg_ear, head_pose["tilt"])
-                
-                # Calculate processing time
-                processing_time = (cv2.getTickCount() - start_time) / cv2.getTickFrequency() * 1000
-                
-                logger.debug(
-                    "Face analysis completed",
-                    face_present=True,
-                    ear=avg_ear,
-                    gaze=gaze_direction,
-                    head_tilt=head_pose["tilt"],
-                    fatigue=fatigue_score,
-                    processing_time_ms=processing_time
-                )
-                
-                return FaceAnalysisResponse(
-                    face_present=True,
-                    blink_rate=avg_ear,
-                    gaze_direction=gaze_direction,
-                    head_tilt=head_pose["tilt"],
-                    fatigue_score=fatigue_score,
-                    processing_time_ms=processing_time
-                )
+            # Calculate EAR for both eyes in one gather
+            ears = self.calculate_eye_aspect_ratio(
+                self.get_eye_landmarks(landmarks, EYES_IDX)
+            )
+            avg_ear = float(np.mean(ears))
+            
+            # Head pose estimation
+            head_pose = self.estimate_head_pose(landmarks)
+            
+            # Gaze direction
+            gaze_direction = self.estimate_gaze_direction(landmarks)
+            
+            # Fatigue scoring
+            fatigue_score = self.calculate_fatigue_score(avg_ear, head_pose["tilt"])
+            
+            # Calculate processing time
+            processing_time = (time.perf_counter_ns() - start_ns) / 1e6
+            
+            logger.debug(
+                "Face analysis completed",
+                face_present=True,
+                ear=avg_ear,
+                gaze=gaze_direction,
+                head_tilt=head_pose["tilt"],
+                fatigue=fatigue_score,
+                processing_time_ms=processing_time
+            )
+            
+            return FaceAnalysisResponse(
+                face_present=True,
+                blink_rate=avg_ear,
+                gaze_direction=gaze_direction,
+                head_tilt=head_pose["tilt"],
+                fatigue_score=fatigue_score,
+                processing_time_ms=processing_time
+            )
             
-            else:
-                logger.debug("Face detected but mesh analysis failed")
-                return FaceAnalysisResponse(
-                    face_present=True,
-                    blink_rate=0.0,
-                    gaze_direction=GazeDirection.UNKNOWN,
-                    head_tilt=0.0,
-                    fatigue_score=0.0
-                )
-                
         except Exception as e:
             logger.error("Error in face analysis", error=str(e))
             return FaceAnalysisResponse(
@@ -1,30 +1,89 @@
 import cv2
 import numpy as np
 import base64
+import binascii
+
+# SIMD (libbase64) decoder for large screenshot payloads; stdlib is the fallback
+try:
+    import pybase64 as _b64
+except Exception:
+    _b64 = base64
+
+# libjpeg-turbo decode with in-IDCT downscaling; falls back to cv2.imdecode
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
+MAX_W, MAX_H = 640, 480
+
+_REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_size(data: bytes):
+    """(w, h) from a JPEG SOF header without decoding; None if not found."""
+    i = 2
+    while i + 9 <= len(data) and data[i] == 0xFF:
+        marker = data[i + 1]
+        if marker in _JPEG_SOF:
+            return int.from_bytes(data[i + 7:i + 9], 'big'), int.from_bytes(data[i + 5:i + 7], 'big')
+        i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+    return None
+
+
+def _reduction(w: int, h: int):
+    """Largest 1/2, 1/4, 1/8 divisor that still covers the resize_image target."""
+    for d in (8, 4, 2):
+        if w // d >= MAX_W and h // d >= MAX_H:
+            return d
+    return None
+
 
 class ImageProcessor:
+    def _decode(self, data: bytes) -> np.ndarray:
+        if _tj is not None and data[:3] == b'\xff\xd8\xff':
+            try:
+                w, h = _tj.decode_header(data)[:2]
+                d = _reduction(w, h)
+                return _tj.decode(data, pixel_format=TJPF_BGR, scaling_factor=(1, d) if d else None)
+            except Exception:
+                pass
+        # JPEG: let libjpeg emit the reduced image directly (DCT scaling) instead of
+        # decoding full-res. Other formats gain nothing from IMREAD_REDUCED_* (OpenCV
+        # decodes full-size and subsamples), so they decode normally and go through
+        # resize_image like everything else.
+        flag = cv2.IMREAD_COLOR
+        if data[:3] == b'\xff\xd8\xff':
+            size = _jpeg_size(data)
+            d = _reduction(*size) if size else None
+            if d:
+                flag = _REDUCED_FLAGS[d]
+        return cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+
     def decode_base64_image(self, b64_or_bytes) -> np.ndarray:
         if isinstance(b64_or_bytes, bytes):
-            image = cv2.imdecode(np.frombuffer(b64_or_bytes, np.uint8), cv2.IMREAD_COLOR)
+            image = self._decode(b64_or_bytes)
         else:
             if ',' in b64_or_bytes:
                 b64_or_bytes = b64_or_bytes.split(',')[1]
             try:
-                img_data = base64.b64decode(b64_or_bytes)
-                image = cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_COLOR)
-            except:
+                img_data = _b64.b64decode(b64_or_bytes, validate=False)
+                image = self._decode(img_data)
+            except (binascii.Error, ValueError, cv2.error):
                 image = None
         return image
 
     def resize_image(self, image: np.ndarray) -> np.ndarray:
         if image is None: return None
-        if image.shape[0] > 480 or image.shape[1] > 640:
-            return cv2.resize(image, (640, 480))
+        if image.shape[0] > MAX_H or image.shape[1] > MAX_W:
+            return cv2.resize(image, (MAX_W, MAX_H), interpolation=cv2.INTER_AREA)
         return image
 
-    def convert_to_grayscale(self, image: np.ndarray) -> np.ndarray:
+    def convert_to_grayscale(self, image: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
         if image is None: return None
-        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
 
     def cleanup_image(self, image: np.ndarray):
         pass